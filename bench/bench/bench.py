@@ -1,8 +1,11 @@
 import datetime
 import logging
+import shlex
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack, contextmanager
+from functools import cached_property
 from pathlib import Path
 from threading import Event
 from subprocess import check_output
@@ -18,7 +21,7 @@ from .utils import (
     PAGE_SIZE,
     Balloon,
     Kernel,
-    function_name,
+    chown_tree,
     node_memory_free,
     round_down,
     round_up,
@@ -49,21 +52,17 @@ class Bench(BaseModel):
     env: dict = {}  # Additional environment variables to pass to the launcher
     pml: bool = False  # Whether enable PML or not
 
-    @property
+    @cached_property
     def dram_size(self) -> int:
         return round_down(self.mem * self.dram_ratio, PAGE_SIZE)
 
-    @property
+    @cached_property
     def pmem_size(self) -> int:
         return round_up(self.mem * (1 - self.dram_ratio), PAGE_SIZE)
 
-    @property
+    @cached_property
     def out_dir(self) -> Path:
-        if not hasattr(self, "_out"):
-            self._out = str(
-                Path("archive") / datetime.datetime.now().astimezone().isoformat()
-            )
-        return Path(self._out)
+        return Path("archive") / datetime.datetime.now().astimezone().isoformat()
 
     @property
     def data_dir(self) -> Path:
@@ -76,6 +75,26 @@ class Bench(BaseModel):
         handler.setFormatter(formatter)
         logger.addHandler(handler)
 
+    def _balloon_wait(self, vms, interval=0.25):
+        """Poll until the balloons of all vms are inflated, at most 3s per GiB of memory"""
+        # without heterogeneous memory the guests boot with an empty balloon,
+        # see Vm.args(), so there is nothing to wait for
+        if not self.hetero:
+            return
+        target = sum(self.balloon.to_size(self.mem, self.dram_size, self.pmem_size))
+        deadline = time.monotonic() + int(self.mem >> 30) * 3
+        pending = list(vms)
+        while pending and time.monotonic() < deadline:
+            time.sleep(interval)
+            pending = [
+                vm
+                for vm in pending
+                if not (stats := vm.memory_stats())
+                or stats.actual + stats.hetero_actual < target
+            ]
+        if pending:
+            LOGGER.warning(f"balloon inflation timed out for vm {[vm.id for vm in pending]}")
+
     def _guests_prepare(self, vms):
         if self.hetero:
             # try allocating memory for balloon while avoiding OOM
@@ -91,16 +110,14 @@ class Bench(BaseModel):
                     if batch == 0:
                         break
                     LOGGER.info(f"preparing guest id {remain - batch}..{remain}")
-                    group = fabric.ThreadingGroup(
-                        *[vm.ip for vm in vms[remain - batch : remain]],
-                        **vms[0].ssh_config,
+                    group = fabric.ThreadingGroup.from_connections(
+                        [vm.ssh for vm in vms[remain - batch : remain]]
                     )
                     prepare_dirs(group, kernel=self.kernel)
                     prepare_kernel(group)
                     if self.balloon:
                         enable_balloon(group, balloon=self.balloon)
-                        balloon_wait = int(self.mem >> 30) * 3
-                        group.sudo(f"sleep {balloon_wait}")
+                        self._balloon_wait(vms[remain - batch : remain])
                     remain -= batch
                 if remain == 0:
                     break
@@ -108,21 +125,40 @@ class Bench(BaseModel):
                     raise RuntimeError("Not enough memory for all VMs")
         else:
             LOGGER.info(f"preparing guest id 0..{len(vms)}")
-            group = fabric.ThreadingGroup(*[vm.ip for vm in vms], **vms[0].ssh_config)
+            group = self._guests
             prepare_dirs(group, kernel=self.kernel)
             prepare_kernel(group)
             if self.balloon:
                 enable_balloon(group, balloon=self.balloon)
-                balloon_wait = int(self.mem >> 30) * 3
-                group.sudo(f"sleep {balloon_wait}")
+                self._balloon_wait(vms)
+
+    def _guests_start(self, stack):
+        from .vm import Vm
+
+        # spawn the daemons of all guests concurrently
+        with ThreadPoolExecutor(max_workers=self.num) as ex:
+            futures = [
+                ex.submit(Vm(id=id, bench=self).__enter__) for id in range(self.num)
+            ]
+        # register the guests that did start, so they are torn down on failure
+        vms = []
+        for f in futures:
+            if not f.exception():
+                vm = f.result()
+                stack.push(vm.__exit__)
+                vms.append(vm)
+        for f in futures:
+            if e := f.exception():
+                raise e
+        return vms
 
     def _guests_wait(self, vms):
-        [vm.wait_for_boot() for vm in vms]
+        # boot all guests concurrently, so the wait is bounded by the slowest one
+        with ThreadPoolExecutor(max_workers=len(vms)) as ex:
+            list(ex.map(lambda vm: vm.wait_for_boot(), vms))
 
     @contextmanager
     def guests(self):
-        from .vm import Vm
-
         out = self.out_dir
         out.mkdir(parents=True)
         self._enable_logging()
@@ -133,14 +169,11 @@ class Bench(BaseModel):
         Path("out").symlink_to(out)
         with ExitStack() as stack:
             # fix permissions after all process shutdown
-            stack.callback(
-                lambda: check_output(
-                    f"sudo chown -R $(id -un):$(id -gn) {out}", shell=True
-                )
-            )
-            vms = [stack.enter_context(Vm(id=id, bench=self)) for id in range(self.num)]
-            self._guests = fabric.ThreadingGroup(
-                *map(lambda vm: vm.ip, vms), **vms[0].ssh_config
+            stack.callback(chown_tree, out)
+            vms = self._guests_start(stack)
+            # share the per-vm connections, so ssh transports stay open for reuse
+            self._guests = fabric.ThreadingGroup.from_connections(
+                [vm.ssh for vm in vms]
             )
             self._guests_wait(vms)
             self._guests_prepare(vms)
@@ -176,8 +209,9 @@ class Bench(BaseModel):
         if not launcher and not self.hetero:
             launcher = " "
         LOGGER.info(kwargs)
-        args = eval(f"{name}_args(**kwargs)")
-        args += f"2> /out/{name}.err | /data/ansi2txt | tee /out/{name}.log "
+        args = shlex.join(ARG_BUILDERS[name](**kwargs))
+        # escapes are stripped on the host after collection, see Vm.strip_logs()
+        args += f" > /out/{name}.log.raw 2> /out/{name}.err "
         default_env = dict(OMP_NUM_THREADS=self.cpu)
         with self.guests() as guests:
             result = launch(
@@ -194,7 +228,7 @@ class Bench(BaseModel):
                 LOGGER.info(f"{name} finished")
 
     def gups(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("gups", **kwargs)
 
     def gups_perf_only(self, **kwargs):
         """
@@ -220,25 +254,25 @@ class Bench(BaseModel):
         return self._benchmark("gups", launcher=" ".join(perf_record), **kwargs)
 
     def graph500(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("graph500", **kwargs)
 
     def pagerank(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("pagerank", **kwargs)
 
     def xsbench(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("xsbench", **kwargs)
 
     def bwaves(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("bwaves", **kwargs)
 
     def roms(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("roms", **kwargs)
 
     def liblinear(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("liblinear", **kwargs)
 
     def btree(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("btree", **kwargs)
 
     def silo(self, **kwargs):
-        return self._benchmark(function_name(), **kwargs)
+        return self._benchmark("silo", **kwargs)
@@ -1,37 +1,61 @@
 # from fabric import task
 import logging
+import shlex
 
 from .utils import Balloon, Kernel
 
 LOGGER = logging.getLogger(__name__)
+LOGS_ARCHIVE = "logs.tar"
+
+
+def sudo_script(c, cmds, **kwargs):
+    """Run a list of commands as root through a single ssh channel and sudo invocation."""
+    script = "\n".join(["set -e", *cmds])
+    return c.sudo(f"bash -c {shlex.quote(script)}", **kwargs)
 
 
 def prepare_dirs(c, kernel):
-    c.sudo("mkdir -p /home/clear /data /out")
-    c.sudo("mount -t virtiofs data /data")
-    c.sudo("mount -t virtiofs out /out")
-    c.sudo("chown -R clear:clear /out /tmp")
-    c.sudo(f"cp -rL /data/{kernel.value} /tmp/")
-    c.sudo("rm -rf /lib/modules/$(uname -r)")
-    c.sudo(f"ln -sf /tmp/{kernel.value} /lib/modules/$(uname -r)")
-    c.sudo("depmod --all", hide=True)
-    c.sudo("uname -a > /out/uname")
+    sudo_script(
+        c,
+        [
+            "mkdir -p /home/clear /data /out",
+            "mount -t virtiofs data /data",
+            "mount -t virtiofs out /out",
+            "chown -R clear:clear /out /tmp",
+            # overlay the shared modules instead of copying them, so that depmod
+            # writes into the guest tmpfs rather than the shared /data
+            "mkdir -p /tmp/modules/upper /tmp/modules/work",
+            "rm -rf /lib/modules/$(uname -r) && mkdir -p /lib/modules/$(uname -r)",
+            f"mount -t overlay overlay -o lowerdir=/data/{kernel.value},"
+            "upperdir=/tmp/modules/upper,workdir=/tmp/modules/work "
+            "/lib/modules/$(uname -r)",
+            "depmod --all",
+            "uname -a > /out/uname",
+        ],
+        hide=True,
+    )
 
 
 def prepare_kernel(c):
-    c.sudo("sudo swupd autoupdate --disable", hide=True)
-    c.sudo("sysctl -w kernel.kptr_restrict=0", hide=True)
-    c.sudo("sysctl -w kernel.perf_event_paranoid=-1", hide=True)
-    # c.sudo("sysctl -w kernel.perf_cpu_time_max_percent=25", hide=True)
-    c.sudo("sysctl -w vm.overcommit_memory=1", hide=True)
-    c.sudo("sysctl -w vm.compaction_proactiveness=0", hide=True)
-    c.sudo("sysctl -w vm.extfrag_threshold=1000", hide=True)
-    c.sudo("echo 2 | sudo tee /sys/kernel/mm/ksm/run", hide=True)
-    c.sudo("echo 3 | sudo tee /proc/sys/vm/drop_caches", hide=True)
-    c.sudo("echo 1 | sudo tee /sys/kernel/tracing/options/funcgraph-retval", hide=True, warn=True)
-    c.sudo("echo never | sudo tee /sys/kernel/mm/transparent_hugepage/enabled", hide=True)
-    c.sudo("echo never | sudo tee /sys/kernel/mm/transparent_hugepage/defrag", hide=True)
-    c.sudo("swapoff -a")
+    sudo_script(
+        c,
+        [
+            "swupd autoupdate --disable",
+            "sysctl -w kernel.kptr_restrict=0",
+            "sysctl -w kernel.perf_event_paranoid=-1",
+            # "sysctl -w kernel.perf_cpu_time_max_percent=25",
+            "sysctl -w vm.overcommit_memory=1",
+            "sysctl -w vm.compaction_proactiveness=0",
+            "sysctl -w vm.extfrag_threshold=1000",
+            "echo 2 > /sys/kernel/mm/ksm/run",
+            "echo 3 > /proc/sys/vm/drop_caches",
+            "echo 1 > /sys/kernel/tracing/options/funcgraph-retval || true",
+            "echo never > /sys/kernel/mm/transparent_hugepage/enabled",
+            "echo never > /sys/kernel/mm/transparent_hugepage/defrag",
+            "swapoff -a",
+        ],
+        hide=True,
+    )
 
 
 def collect_logs(c):
@@ -42,21 +66,35 @@ def collect_logs(c):
         "/sys/kernel/debug/tracing/trace",
         "/sys/kernel/mm/",
     ]
-    c.sudo("cp -rt /out " + " ".join(cp), hide=True, warn=True)
-    mv = [
-        "/home/clear/*.txt",
-        "/home/clear/*.log",
-        "/home/clear/*.err",
-        "/home/clear/*.csv",
-        "/home/clear/*.data",
-    ]
-    c.sudo("mv -ft /out " + " ".join(mv), hide=True, warn=True)
-    c.sudo("dmesg > /out/dmesg")
-    c.sudo("sysctl --all > /out/sysctl")
+    home = "/home/clear"
+    mv = ["*.txt", "*.log", "*.err", "*.csv", "*.data"]
+    # pseudo-files read as empty through tar, stage copies of them on the guest
+    # tmpfs and ship them as a single archive, see Vm.unpack_logs()
+    stage = "/tmp/logs"
+    result = sudo_script(
+        c,
+        [
+            f"rm -rf {stage} && mkdir -p {stage}",
+            # some sysfs and debugfs attributes are write-only or absent
+            f"cp -rt {stage} " + " ".join(cp) + " || true",
+            f"dmesg > {stage}/dmesg",
+            f"sysctl --all > {stage}/sysctl",
+            f"tar -cf /out/{LOGS_ARCHIVE} -C {stage} .",
+            # regular files such as perf data may take gigabytes, move them as is
+            "shopt -s nullglob",
+            f"cd {home}",
+            f"files=({' '.join(mv)})",
+            '[ ${#files[@]} -eq 0 ] || mv -ft /out "${files[@]}"',
+        ],
+        hide=True,
+        warn=True,
+    )
+    if result.failed:
+        LOGGER.warning(f"collecting logs failed: {result.stderr.strip()}")
 
 
-def enable_balloon(c, balloon):
-    match Balloon(balloon):
+def enable_balloon(c, balloon: Balloon):
+    match balloon:
         case Balloon.hetero:
             c.sudo("modprobe demeter_balloon")
         case Balloon.legacy:
@@ -64,13 +102,19 @@ def enable_balloon(c, balloon):
 
 
 def disable_tiering(c):
-    c.sudo("sysctl -w kernel.numa_balancing=0", hide=True)
-    c.sudo("echo 0 | sudo tee /sys/kernel/mm/numa/demotion_enabled", hide=True)
+    sudo_script(
+        c,
+        [
+            "sysctl -w kernel.numa_balancing=0",
+            "echo 0 > /sys/kernel/mm/numa/demotion_enabled",
+        ],
+        hide=True,
+    )
 
 
-def launch(c, kernel, args, env: dict = {}, numactl="", time="/bin/time --verbose", launcher = None):
+def launch(c, kernel: Kernel, args, env: dict = {}, numactl="", time="/bin/time --verbose", launcher = None):
     if not launcher :
-        match Kernel(kernel):
+        match kernel:
             case Kernel.demeter:
                 launcher = "demeter.py "
             case Kernel.memtis:
@@ -1,16 +1,19 @@
 import logging
 import os
 import grp
+import re
 import signal
 import subprocess
 import time
 from contextlib import contextmanager
 from enum import Enum
+from functools import cache
 from pathlib import Path
 
 LOGGER = logging.getLogger(__name__)
 
 PAGE_SIZE = 4096
+ANSI_ESCAPE = re.compile(rb"\x1b\[[0-9;]*m")
 
 
 class Kernel(str, Enum):
@@ -49,6 +52,7 @@ def erange(start, end, mul):
         start *= mul
 
 
+@cache
 def node_memory_total(node: int) -> int:
     import numa
 
@@ -58,50 +62,67 @@ def node_memory_total(node: int) -> int:
 def node_memory_free(node: int) -> int:
     import numa
 
-    return numa.memory.node_memory_info(node)[0]
+    return numa.memory.node_memory_info(node)[1]
 
 
-def memory_nodes():
+@cache
+def memory_nodes() -> tuple[int, ...]:
     import numa
 
-    return filter(
-        lambda n: node_memory_total(n) > 0, range(numa.info.get_max_possible_node() + 1)
+    return tuple(
+        filter(
+            lambda n: node_memory_total(n) > 0,
+            range(numa.info.get_max_possible_node() + 1),
+        )
     )
 
 
-def node_to_cpus(node: int):
+@cache
+def node_to_cpus(node: int) -> tuple[int, ...]:
     from numa import LIBNUMA, utils
 
     cpu_mask = LIBNUMA.numa_allocate_cpumask()
-    LIBNUMA.numa_bitmask_clearall(cpu_mask)
-    res = LIBNUMA.numa_node_to_cpus(node, cpu_mask)
-    if res == 0:
-        return utils.get_bitset_list(cpu_mask)
-    else:
-        return []
+    try:
+        LIBNUMA.numa_bitmask_clearall(cpu_mask)
+        res = LIBNUMA.numa_node_to_cpus(node, cpu_mask)
+        return tuple(utils.get_bitset_list(cpu_mask)) if res == 0 else ()
+    finally:
+        LIBNUMA.numa_bitmask_free(cpu_mask)
+
+
+def open_log(path) -> int:
+    """Open a log file as a raw fd, to be handed over to a child process"""
+    return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
 
 
 @contextmanager
 def daemon(args, stdout, stderr, sudo=False):
-    with open(stdout, "w") as stdout, open(stderr, "w") as stderr:
-        LOGGER.info(f"starting daemon {args[0]!r}")
-        LOGGER.info(" ".join(f"{arg!r}" for arg in args))
+    LOGGER.info(f"starting daemon {args[0]!r}")
+    LOGGER.info(" ".join(f"{arg!r}" for arg in args))
+    stdout, stderr = open_log(stdout), open_log(stderr)
+    try:
         p = subprocess.Popen(
             args,
             stdin=subprocess.DEVNULL,
             stdout=stdout,
             stderr=stderr,
-            preexec_fn=os.setsid if sudo else None,
+            # setsid in the child without running python between fork and exec,
+            # daemons are started from several threads at once
+            start_new_session=sudo,
         )
-        try:
-            yield p
-        finally:
-            if sudo:
-                os.killpg(os.getpgid(p.pid), signal.SIGTERM)
-            else:
-                p.terminate()
-            p.wait()
-            LOGGER.info(f"daemon {args[0]!r} exited with {p.returncode}")
+    finally:
+        # the child holds its own copies now
+        os.close(stdout)
+        os.close(stderr)
+    try:
+        yield p
+    finally:
+        if sudo:
+            os.killpg(os.getpgid(p.pid), signal.SIGTERM)
+        else:
+            p.terminate()
+        p.wait()
+        LOGGER.info(f"daemon {args[0]!r} exited with {p.returncode}")
 
 
 def sshfs(ip: str, mount: Path):
@@ -145,12 +166,20 @@ def pcm_memory(csv: Path):
     )
 
 
+def ansi2txt(raw: Path, txt: Path):
+    """Strip color escapes line by line, the same as script/ansi2txt"""
+    with open(raw, "rb") as src, open(txt, "wb") as dst:
+        for line in src:
+            dst.write(ANSI_ESCAPE.sub(b"", line))
+
+
 def round_down(n, m):
-    return int(n) // m * m
+    # masking is enough for powers of two such as PAGE_SIZE
+    return int(n) & -m if m & (m - 1) == 0 else int(n) // m * m
 
 
 def round_up(n, m):
-    return (int(n) + m - 1) // m * m
+    return (int(n) + m - 1) & -m if m & (m - 1) == 0 else (int(n) + m - 1) // m * m
 
 
 def function_name():
@@ -174,21 +203,60 @@ def collect_datapoints(name: str, archive=Path("archive")):
         end = datetime.now()
         time.sleep(1)
 
-        def check_ts(d: Path) -> bool:
+        def check_ts(d: os.DirEntry) -> bool:
             ts = datetime.fromtimestamp(d.stat().st_ctime)
             return d.is_dir() and start < ts < end
 
+        # collect the runs in one directory pass before creating the store
+        with os.scandir(archive) as it:
+            runs = [d.name for d in it if check_ts(d)]
         store = archive / (start.astimezone().isoformat() + "-" + name)
         store.mkdir(parents=True, exist_ok=True)
-        [d.rename(store / d.name) for d in filter(check_ts, archive.iterdir())]
+        for run in runs:
+            (archive / run).rename(store / run)
+
+
+def chown_tree(root: Path):
+    """Give everything under root back to the current user with a single sudo call.
+
+    Foreign directories are chowned recursively without being descended into,
+    so only the entries we already own are stat'ed from Python.
+    """
+    uid, gid = os.getuid(), os.getgid()
+    foreign = []
+
+    def visit(path, st, is_dir):
+        if st.st_uid != uid or st.st_gid != gid:
+            foreign.append(os.fsencode(path))
+        elif is_dir:
+            with os.scandir(path) as it:
+                for e in it:
+                    st = e.stat(follow_symlinks=False)
+                    visit(e.path, st, e.is_dir(follow_symlinks=False))
+
+    visit(root, os.lstat(root), root.is_dir())
+    if foreign:
+        subprocess.run(
+            ["sudo", "xargs", "-0", "-r", "chown", "-hR", f"{uid}:{gid}", "--"],
+            input=b"\0".join(foreign),
+            check=True,
+        )
 
 
 def pid_children(pid):
-    """Get all child processes recursively for a given PID."""
-    import subprocess
-
-    out = subprocess.check_output(
-        f"sudo pstree -p {pid} | grep -o '[[:digit:]]*'",
-        shell=True,
-    )
-    return [int(pid) for pid in out.decode().strip().split()]
+    """Get all child processes and threads recursively for a given PID."""
+    out, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            tids = [int(tid) for tid in os.listdir(f"/proc/{p}/task")]
+        except FileNotFoundError:
+            continue
+        out.extend(tids)
+        for tid in tids:
+            try:
+                children = Path(f"/proc/{p}/task/{tid}/children").read_text()
+            except FileNotFoundError:
+                continue
+            stack.extend(int(c) for c in children.split())
+    return out
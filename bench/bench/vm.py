@@ -1,8 +1,13 @@
 import json
 import logging
+import os
+import socket
+import stat
+import tarfile
+import time
 from contextlib import ExitStack
+from functools import cached_property
 from io import StringIO
-from itertools import chain, cycle, islice
 from pathlib import Path
 from subprocess import check_output, run
 
@@ -13,8 +18,8 @@ from paramiko.ssh_exception import NoValidConnectionsError
 from pydantic import BaseModel
 
 from .bench import Bench
-from .tasks import collect_logs
-from .utils import Balloon, Kernel, daemon, node_to_cpus, pid_children, virtiofsd
+from .tasks import LOGS_ARCHIVE, collect_logs
+from .utils import Balloon, Kernel, ansi2txt, daemon, node_to_cpus, pid_children, virtiofsd
 from .vm_api import Api
 
 LOGGER = logging.getLogger(__name__)
@@ -29,6 +34,24 @@ AAAEADukMln75L+JugPVHYDdF58mrKdT+DPbNROVEhI0QMDdI0chGIKX8+R4oyO44rzLlA
 O+WBjzN5iJcQHp5pUtk3AAAADGpsaHVAcGM5MDA0OAE=
 -----END OPENSSH PRIVATE KEY-----"""
 PRIVATE_KEY = Ed25519Key.from_private_key(StringIO(PRIVATE_KEY_TEXT))
+# disable stdin, shared by all guests
+SSH_CONFIG = fabric.Config(
+    overrides=dict(
+        run=dict(
+            in_stream=False,
+        ),
+    ),
+)
+
+
+def _skip_unsafe(member, path):
+    """Extract like the "data" filter, but skip members it rejects instead of
+    aborting, such as the sysfs symlinks pointing out of /sys/kernel/mm/"""
+    try:
+        return tarfile.data_filter(member, path)
+    except tarfile.FilterError as e:
+        LOGGER.warning(f"skipping {member.name} from {LOGS_ARCHIVE}: {e}")
+        return None
 
 
 class MemoryStatistics(BaseModel):
@@ -72,20 +95,13 @@ class Vm(BaseModel):
     def mac(self) -> str:
         return f"2e:89:a8:e4:92:{self.id:02x}"
 
-    @property
+    @cached_property
     def ssh_config(self):
         return dict(
             user="clear",
             connect_timeout=self.bench.timeout,
             connect_kwargs=dict(pkey=PRIVATE_KEY),
-            # disable stdin
-            config=fabric.Config(
-                overrides=dict(
-                    run=dict(
-                        in_stream=False,
-                    ),
-                ),
-            ),
+            config=SSH_CONFIG,
         )
 
     def memory_stats(self):
@@ -156,54 +172,53 @@ class Vm(BaseModel):
         pml,
         api,
     ):
-        host_cpus = list(
-            islice(cycle(node_to_cpus(cpu_node)), vcpus * id, vcpus * (id + 1))
+        cpus = node_to_cpus(cpu_node)
+        assert cpus, f"node {cpu_node} has no cpus to pin the vcpus to"
+        host_cpus = ",".join(
+            str(cpus[(vcpus * id + i) % len(cpus)]) for i in range(vcpus)
         )
-        host_cpus = ",".join(str(c) for c in host_cpus)
         affinity = ",".join(f"{v}@[{host_cpus}]" for v in range(vcpus))
-        args = dict(
-            binary=["cloud-hypervisor"],
-            cpu=["--cpus", f"boot={vcpus},affinity=[{affinity}]"],
-            memory=["--memory", "size=0,shared=on"],
-            zones=[
+        args = ["cloud-hypervisor"]
+        args += ["--cpus", f"boot={vcpus},affinity=[{affinity}]"]
+        args += ["--memory", "size=0,shared=on"]
+        if hetero:
+            args += [
                 "--memory-zone",
                 f"id=dram,size={total_mem if balloon else dram_size},shared=on,host_numa_node={dram_node}",
                 f"id=pmem,size={total_mem if balloon else pmem_size},shared=on,host_numa_node={pmem_node}",
             ]
-            if hetero
-            else ["--memory-zone", f"id=ram,size={total_mem},shared=on"],
-            numa=[
+            args += [
                 "--numa",
                 f"guest_numa_id=0,cpus=[0-{vcpus - 1}]",
                 "guest_numa_id=1,memory_zones=[dram]",
                 "guest_numa_id=2,memory_zones=[pmem]",
             ]
-            if hetero
-            else [],
-            kernel=["--kernel", f"{kernel}"],
-            cmdline=["--cmdline", cmdline],
-            disk=["--disk", f"path={rootfs}"],
-            fs=[
-                "--fs",
-                f"tag=data,socket={data_socket}",
-                f"tag=out,socket={out_socket}",
-            ],
-            net=["--net", f"tap={tap},mac={mac}"],
-            balloon=[
+        else:
+            args += ["--memory-zone", f"id=ram,size={total_mem},shared=on"]
+        args += ["--kernel", f"{kernel}"]
+        args += ["--cmdline", cmdline]
+        args += ["--disk", f"path={rootfs}"]
+        args += [
+            "--fs",
+            f"tag=data,socket={data_socket}",
+            f"tag=out,socket={out_socket}",
+        ]
+        args += ["--net", f"tap={tap},mac={mac}"]
+        if balloon:
+            args += [
                 "--balloon",
                 balloon.to_cmdline(total_mem, dram_size, pmem_size)
                 if hetero
                 else "size=[0,0]",
             ]
-            if balloon
-            else [],
-            console=["--console", "off"],
-            serial=["--serial", "tty"],
-            gdb=["--gdb", f"path={gdb}"] if gdb else [],
-            pml=["--hmem", "delay=10s,interval=100ms"] if pml else [],
-            api=["--api-socket", f"path={api}"],
-        )
-        return list(chain.from_iterable(args.values()))
+        args += ["--console", "off"]
+        args += ["--serial", "tty"]
+        if gdb:
+            args += ["--gdb", f"path={gdb}"]
+        if pml:
+            args += ["--hmem", "delay=10s,interval=100ms"]
+        args += ["--api-socket", f"path={api}"]
+        return args
 
     def __enter__(self):
         self.out_dir.mkdir(exist_ok=True)
@@ -269,52 +284,89 @@ class Vm(BaseModel):
     def pid(self):
         return self._pid
 
+    @property
+    def ssh(self) -> fabric.Connection:
+        return self._ssh
+
     def collect_kvm_logs(self):
         """see kvm_create_vm_debugfs() in kvm_main.c"""
-        vm_debugfs = list(
-            chain.from_iterable(
-                check_output(
-                    f"sudo find /sys/kernel/debug/kvm/ -name '{pid}-*'",
-                    shell=True,
-                    text=True,
-                )
-                .strip()
-                .split()
-                for pid in pid_children(self.pid)
-            )
-        )
+        pids = {str(pid) for pid in pid_children(self.pid)}
+        vm_debugfs = [
+            name
+            for name in check_output(
+                ["sudo", "ls", "/sys/kernel/debug/kvm/"], text=True
+            ).split()
+            if name.split("-", 1)[0] in pids
+        ]
         assert len(vm_debugfs) == 1, (
             f"there should only be one vm_debugfs for each vm, found {len(vm_debugfs)} directories"
         )
-        dir = Path(vm_debugfs[0])
-        check_output(
-            f"""
-                sudo cp -r {dir} {self.out_dir} ;
-                sudo chown -R $(id -un):$(id -gn) {self.out_dir} ;
-                ln -srf {self.out_dir}/{dir.name} {self.out_dir}/kvm ;
-                find {self.out_dir} -type s -delete || true ;
-            """,
-            shell=True,
-        )
+        dir = Path("/sys/kernel/debug/kvm") / vm_debugfs[0]
+        # debugfs is only readable by root, and the vm folder is owned by the
+        # guest user or root through virtiofsd, reclaim all of it for the user
+        script = f"""
+            cp -r {dir} {self.out_dir} ;
+            chown -R {os.getuid()}:{os.getgid()} {self.out_dir} ;
+        """
+        check_output(["sudo", "bash", "-c", script])
+        kvm = self.out_dir / "kvm"
+        kvm.unlink(missing_ok=True)
+        kvm.symlink_to(dir.name)
+        with os.scandir(self.out_dir) as it:
+            for e in it:
+                if stat.S_ISSOCK(e.stat(follow_symlinks=False).st_mode):
+                    os.unlink(e.path)
+
+    def unpack_logs(self):
+        """Extract the archive shipped by collect_logs(), owned by the current user"""
+        archive = self.out_dir / LOGS_ARCHIVE
+        with tarfile.open(archive) as tar:
+            tar.extractall(self.out_dir, filter=_skip_unsafe)
+        archive.unlink()
+
+    def strip_logs(self):
+        """Turn the raw workload logs into plain text on the host cpus"""
+        for raw in self.out_dir.glob("*.log.raw"):
+            ansi2txt(raw, raw.with_suffix(""))
+            raw.unlink()
 
     def __exit__(self, ty, val, tb):
         LOGGER.info(f"vm {self.id} stopping")
-        if ty is None:
-            collect_logs(self._ssh)
-            self.collect_kvm_logs()
-            self._ssh.sudo("poweroff", hide=True, warn=True)
-        return self._stack.__exit__(ty, val, tb)
+        try:
+            if ty is None:
+                collect_logs(self._ssh)
+                # takes ownership of the vm folder, unpacking and stripping need it
+                self.collect_kvm_logs()
+                self.unpack_logs()
+                self.strip_logs()
+        finally:
+            # tear down even without logs, the daemons and sockets leak otherwise
+            if ty is None:
+                self._ssh.sudo("poweroff", hide=True, warn=True)
+            self._ssh.close()
+            suppress = self._stack.__exit__(ty, val, tb)
+        return suppress
 
     def wait_for_boot(self):
-        for retry in reversed(range(self.bench.timeout)):
+        for attempt, retry in enumerate(reversed(range(self.bench.timeout))):
             try:
+                # a cheap tcp probe first, only handshake once sshd is listening
+                with socket.create_connection((self.ip, 22), timeout=0.5):
+                    pass
                 self._ssh.run("date -Is", hide=True)
             except NoValidConnectionsError:
                 pass
             except GroupException:
                 pass
+            except OSError:
+                # sshd not listening yet
+                pass
             else:
                 LOGGER.info(f"vm {self.id} booted")
+                # keep the transport alive across long running workloads for reuse
+                self._ssh.transport.set_keepalive(30)
                 break
             if retry == 0:
                 raise RuntimeError(f"vm {self.id} failed to boot")
+            # back off so that a not-yet-booted sshd is not hammered
+            time.sleep(min(2**attempt, 5))
@@ -1,33 +1,72 @@
+import json
 import logging
 from collections import namedtuple
 from http import HTTPStatus
 
-import httpx
-
 LOGGER = logging.getLogger(__name__)
+JSON_HEADERS = {"content-type": "application/json"}
+VMM_RESOURCES = dict(
+    ping="/vmm.ping",
+    shutdown="/vmm.shutdown",
+)
+VM_RESOURCES = dict(
+    add_device="/vm.add-device",
+    add_disk="/vm.add-disk",
+    add_fs="/vm.add-fs",
+    add_net="/vm.add-net",
+    add_pmem="/vm.add-pmem",
+    add_vdpa="/vm.add-vdpa",
+    add_sock="/vm.add-vsock",
+    boot="/vm.boot",
+    coredump="/vm.coredump",
+    counters="/vm.counters",
+    create="/vm.create",
+    delete="/vm.delete",
+    info="/vm.info",
+    pause="/vm.pause",
+    power_button="/vm.power-button",
+    reboot="/vm.reboot",
+    receive_migration="/vm.receive-migration",
+    remove_device="/vm.remove-device",
+    resize="/vm.resize",
+    resize_zone="/vm.resize-zone",
+    restore="/vm.restore",
+    resume="/vm.resume",
+    send_migration="/vm.send-migration",
+    shutdown="/vm.shutdown",
+    snapshot="/vm.snapshot",
+)
+VMM_PATHS = tuple(VMM_RESOURCES.values())
+VM_PATHS = tuple(VM_RESOURCES.values())
+VmmApi = namedtuple("VmmApi", VMM_RESOURCES.keys())
+VmApi = namedtuple("VmApi", VM_RESOURCES.keys())
 
 
 class Resource:
     """An abstraction over a REST path"""
 
+    __slots__ = ("_api", "resource", "id_field", "_url")
+
     def __init__(self, api, resource, id_field=None):
         self._api = api
         self.resource = resource
         self.id_field = id_field
+        self._url = api.endpoint + resource
 
     def get(self):
         """Make a GET request"""
-        url = self._api.endpoint + self.resource
-        res = self._api.session.get(url)
+        res = self._api.session.get(self._url)
         if res.status_code != HTTPStatus.OK:
             raise RuntimeError(res.text)
         return res
 
     def request(self, method, path, **kwargs):
         """Make an HTTP request"""
-        kwargs = {key: val for key, val in kwargs.items() if val is not None}
-        url = self._api.endpoint + path
-        res = self._api.session.request(method, url, json=kwargs)
+        if None in kwargs.values():
+            kwargs = {key: val for key, val in kwargs.items() if val is not None}
+        url = self._url if path == self.resource else self._api.endpoint + path
+        body = json.dumps(kwargs, separators=(",", ":")).encode()
+        res = self._api.session.request(method, url, content=body, headers=JSON_HEADERS)
         if res.status_code != HTTPStatus.NO_CONTENT:
             raise RuntimeError(res.text)
         return res
@@ -54,38 +93,19 @@ class Api:
     def __init__(self, api_usocket_path):
         self.socket = api_usocket_path
         self.endpoint = "http://localhost/api/v1"
-        self.session = httpx.Client(transport=httpx.HTTPTransport(uds=str(api_usocket_path)), timeout=120)
+        # imported lazily, httpx drags in h11, anyio, certifi, idna, ...
+        import httpx
 
-        vmm = dict(
-            ping=Resource(self, "/vmm.ping"),
-            shutdown=Resource(self, "/vmm.shutdown"),
+        # a single persistent connection per vmm, the api server handles requests serially
+        self.session = httpx.Client(
+            transport=httpx.HTTPTransport(
+                uds=str(api_usocket_path),
+                limits=httpx.Limits(
+                    max_connections=1, max_keepalive_connections=1, keepalive_expiry=None
+                ),
+            ),
+            timeout=120,
         )
-        self.vmm = namedtuple("VmmApi", vmm.keys())(*vmm.values())
-        vm = dict(
-            add_device=Resource(self, "/vm.add-device"),
-            add_disk=Resource(self, "/vm.add-disk"),
-            add_fs=Resource(self, "/vm.add-fs"),
-            add_net=Resource(self, "/vm.add-net"),
-            add_pmem=Resource(self, "/vm.add-pmem"),
-            add_vdpa=Resource(self, "/vm.add-vdpa"),
-            add_sock=Resource(self, "/vm.add-vsock"),
-            boot=Resource(self, "/vm.boot"),
-            coredump=Resource(self, "/vm.coredump"),
-            counters=Resource(self, "/vm.counters"),
-            create=Resource(self, "/vm.create"),
-            delete=Resource(self, "/vm.delete"),
-            info=Resource(self, "/vm.info"),
-            pause=Resource(self, "/vm.pause"),
-            power_button=Resource(self, "/vm.power-button"),
-            reboot=Resource(self, "/vm.reboot"),
-            receive_migration=Resource(self, "/vm.receive-migration"),
-            remove_device=Resource(self, "/vm.remove-device"),
-            resize=Resource(self, "/vm.resize"),
-            resize_zone=Resource(self, "/vm.resize-zone"),
-            restore=Resource(self, "/vm.restore"),
-            resume=Resource(self, "/vm.resume"),
-            send_migration=Resource(self, "/vm.send-migration"),
-            shutdown=Resource(self, "/vm.shutdown"),
-            snapshot=Resource(self, "/vm.snapshot"),
-        )
-        self.vm = namedtuple("VmApi", vm.keys())(*vm.values())
+
+        self.vmm = VmmApi(*(Resource(self, path) for path in VMM_PATHS))
+        self.vm = VmApi(*(Resource(self, path) for path in VM_PATHS))
@@ -2,8 +2,15 @@ from pathlib import Path
 from typing import Literal
 
 
+_GUPS_WORKLOADS = dict(
+    hotset="hotset --hot={hot} --weight={weight}",
+    zipf="zipf --exponent={exponent}",
+    random="",
+)
+
+
 def gups_args(
-    bin: Path | str = Path("/data/gups"),
+    bin: Path | str = "/data/gups",
     thread: int = 4,
     update: int = int(8e8),
     granularity: int = 8,
@@ -16,100 +23,101 @@ def gups_args(
     # ms
     report: int | None = 1000,
     dram_ratio: int | None = None,  # report the percentage of memory in DRAM
-):
+) -> list[str]:
+    if workload not in _GUPS_WORKLOADS:
+        raise ValueError(f"workload {workload} not supported")
     delta = (2 << 20) * thread  # avoid some trivial corner cases
     len -= delta
     hot -= delta
-    args = f"{str(bin)} --{thread=} --{update=} --{len=} --{granularity=} "
-    args += f"--{report=} " if report is not None else ""
-    args += f"--dram-ratio {dram_ratio} " if dram_ratio is not None else ""
-    match workload:
-        case "hotset":
-            args += f"{workload} --{hot=} --{weight=} "
-            args += "--reverse " if reverse else ""
-        case "zipf":
-            args += f"{workload} --{exponent=} "
-            args += "--reverse " if reverse else ""
-        case "random":
-            pass
-        case _:
-            raise ValueError(f"workload {workload} not supported")
+    args = [str(bin), f"--{thread=}", f"--{update=}", f"--{len=}"]
+    args += [f"--{granularity=}"]
+    args += [f"--{report=}"] if report is not None else []
+    args += ["--dram-ratio", str(dram_ratio)] if dram_ratio is not None else []
+    args += (
+        _GUPS_WORKLOADS[workload]
+        .format(hot=hot, weight=weight, exponent=exponent)
+        .split()
+    )
+    args += ["--reverse"] if reverse and workload != "random" else []
     return args
 
 
 def graph500_args(
-    bin: Path | str = Path("/data/omp-csr"),
+    bin: Path | str = "/data/omp-csr",
     s: int = 24,  # (memory exponentially)
     e: int = 24,  # (memory linearly)
     n: int = 10,  # (runtime)
-):
-    bin = str(bin)
-    args = f"{bin} -V -s {s} -e {e} -n {n} "
-    return args
+) -> list[str]:
+    return [str(bin), "-V", "-s", str(s), "-e", str(e), "-n", str(n)]
 
 
 def pagerank_args(
-    bin: Path | str = Path("/data/pr"),
-    f: Path | str = Path("/data/twitter.sg"),
+    bin: Path | str = "/data/pr",
+    f: Path | str = "/data/twitter.sg",
     i: int = 20,
     n: int = 5,  # (runtime)
-):
-    bin, f = str(bin), str(f)
-    args = f"{bin} -l -a -f {f} -n {n} -i {i} "
-    return args
+) -> list[str]:
+    return [str(bin), "-l", "-a", "-f", str(f), "-n", str(n), "-i", str(i)]
 
 
 def xsbench_args(
-    bin: Path | str = Path("/data/XSBench"),
+    bin: Path | str = "/data/XSBench",
     t: int = 4,  # threads
     l: int = 34,  # XS Lookups per Particle
     g: int = 25000,  # Gridpoints (per Nuclide) (memory linearly)
     p: int = 10000000,  # Particle Histories (runtime)
-):
-    bin = str(bin)
-    args = f"{bin} -m history -G unionized -t {t} -l {l} -g {g} -p {p} "
+) -> list[str]:
+    args = [str(bin), "-m", "history", "-G", "unionized"]
+    args += ["-t", str(t), "-l", str(l), "-g", str(g), "-p", str(p)]
     return args
 
 
-def bwaves_args():
-    args = "/data/bind-stdin /data/bwaves_s.in /data/bwaves_s "
-    return args
+def bwaves_args() -> list[str]:
+    return ["/data/bind-stdin", "/data/bwaves_s.in", "/data/bwaves_s"]
 
 
 # memtis (67.9GB)
 # /data/train -m 36 -s 6 /data/kdd12
 def liblinear_args(
-    bin: Path | str = Path("/data/train"),
+    bin: Path | str = "/data/train",
     m: int = 4,
     s: int = 2,
-    model: Path | str = Path("/data/kdda"),
-):
-    bin, model = str(bin), str(model)
-    args = f"{bin} -m {m} -s {s} {model} /dev/null "
-    return args
+    model: Path | str = "/data/kdda",
+) -> list[str]:
+    return [str(bin), "-m", str(m), "-s", str(s), str(model), "/dev/null"]
 
 
 def btree_args(
-    bin: Path | str = Path("/data/bench_btree_mt"),
+    bin: Path | str = "/data/bench_btree_mt",
     n: int = 2 * 10**8,  # elements
     l: int = 2 * 10**10,  # lookups
-):
-    bin = str(bin)
-    args = f"{bin} -- -n {n} -l {l} "
-    return args
+) -> list[str]:
+    return [str(bin), "--", "-n", str(n), "-l", str(l)]
 
 
 # silo(b="tpcc", s=10, n=5000000)
 # memtis (58.1 GB)
 # /data/dbtest --verbose --slow-exit --parallel-loading --bench ycsb --num-threads 36 --scale-factor 400000 --ops-per-worker=1000000000
 def silo_args(
-    bin: Path | str = Path("/data/dbtest"),
+    bin: Path | str = "/data/dbtest",
     b: str = "ycsb",
     t: int = 4,
     s: int = 55000,
     n: int = 100000000,
-):
-    bin = str(bin)
-    args = bin + " --verbose --slow-exit --parallel-loading "
-    args += f"--bench={b} --num-threads={t} --scale-factor={s} --ops-per-worker={n} "
+) -> list[str]:
+    args = [str(bin), "--verbose", "--slow-exit", "--parallel-loading"]
+    args += [f"--bench={b}", f"--num-threads={t}", f"--scale-factor={s}"]
+    args += [f"--ops-per-worker={n}"]
     return args
+
+
+ARG_BUILDERS = dict(
+    gups=gups_args,
+    graph500=graph500_args,
+    pagerank=pagerank_args,
+    xsbench=xsbench_args,
+    bwaves=bwaves_args,
+    liblinear=liblinear_args,
+    btree=btree_args,
+    silo=silo_args,
+)
@@ -14,6 +14,7 @@ from bench.utils import (
     collect_datapoints,
     erange,
     function_name,
+    memory_nodes,
     node_memory_total,
     node_to_cpus,
 )
@@ -42,14 +43,48 @@ def avg_vm_number(vm_numbers):
     return sum(vm_numbers) // len(vm_numbers)
 
 
+@pytest.fixture
+def access_tracking_grid():
+    """Fixture providing the launcher env of each figure 9a cell."""
+    return [
+        dict(load_latency_sample_period=period, load_latency_threshold=thresh)
+        for period, thresh in product(
+            [127, 257, 509, 1021, 2039, 4093, 8191, 16381, 32771, 65537],
+            range(48, 128 + 1, 8),
+        )
+    ]
+
+
+@pytest.fixture
+def hotness_classification_grid():
+    """Fixture providing the launcher env of each figure 9b cell."""
+    return [
+        dict(split_period_ms=period, rtree_split_thresh=thresh)
+        for period, thresh in product(
+            erange(128, 65536 + 1, 2),
+            range(5, 35 + 1, 3),
+        )
+    ]
+
+
 @pytest.fixture
 def kernel_variants():
     """Fixture providing a list of kernel variants."""
     return Kernel
 
 
+@pytest.fixture(scope="session")
+def topology():
+    """Fixture warming up the cached host NUMA topology once per session."""
+    nodes = memory_nodes()
+    for node in nodes:
+        node_memory_total(node)
+        node_to_cpus(node)
+    return nodes
+
+
 @pytest.fixture
-def bench_base():
+def bench_base(topology):
     """Fixture providing a base Bench configuration."""
     # https://docs.python.org/3/library/functools.html#functools.partial
     # partial allows us to provide default arguments while enabling overriding
@@ -263,52 +298,55 @@ def xsbench_base():
     )
 
 
+def sweep(workload, bench, vm_numbers, kernel_variants):
+    """Run the workload for every (vmnum, kernel) cell.
+
+    Cells are run one at a time on purpose: guests are addressed by fixed ids
+    (tap, ip, root image), and concurrent cells would share host memory
+    bandwidth, skewing the measurements.
+    """
+    for vmnum, kernel in product(vm_numbers, kernel_variants):
+        workload(bench(num=vmnum, kernel=kernel))
+
+
 def test_gups(bench_base, gups_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            gups_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(gups_base, bench_base, vm_numbers, kernel_variants)
 
 
 def test_btree(bench_base, btree_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            btree_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(btree_base, bench_base, vm_numbers, kernel_variants)
 
 
 def test_bwaves(bench_base, bwaves_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            bwaves_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(bwaves_base, bench_base, vm_numbers, kernel_variants)
 
 
 def test_graph500(bench_base, graph500_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            graph500_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(graph500_base, bench_base, vm_numbers, kernel_variants)
 
 
 def test_liblinear(bench_base, liblinear_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            liblinear_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(liblinear_base, bench_base, vm_numbers, kernel_variants)
 
 
 def test_pagerank(bench_base, pagerank_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            pagerank_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(pagerank_base, bench_base, vm_numbers, kernel_variants)
 
 
 def test_silo(bench_base, silo_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            silo_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(silo_base, bench_base, vm_numbers, kernel_variants)
 
 
 def test_xsbench(bench_base, xsbench_base, vm_numbers, kernel_variants):
     with collect_datapoints(function_name()):
-        for vmnum, kernel in product(vm_numbers, kernel_variants):
-            xsbench_base(bench_base(num=vmnum, kernel=kernel))
+        sweep(xsbench_base, bench_base, vm_numbers, kernel_variants)
 
 
 # figure 10-12
@@ -372,43 +410,24 @@ def test_ablation_balloon(bench_base, gups_base, max_vm_number, kernel_variants)
 
 
 # figure 9a
-def test_ablation_sensitivity_acess_tracking(bench_base, gups_base, avg_vm_number):
+# Every cell boots fresh guests on purpose: the knobs are module parameters
+# applied when the launcher loads demeter_placement, and page placement left
+# over from a previous cell would skew the next one.
+def test_ablation_sensitivity_acess_tracking(
+    bench_base, gups_base, avg_vm_number, access_tracking_grid
+):
     with collect_datapoints(function_name()):
-        for period, thresh in product(
-            [127, 257, 509, 1021, 2039, 4093, 8191, 16381, 32771, 65537],
-            range(48, 128 + 1, 8),
-        ):
-            gups_base(
-                bench_base(
-                    num=avg_vm_number,
-                    balloon=None,
-                    env=dict(
-                        load_latency_sample_period=period,
-                        load_latency_threshold=thresh,
-                    ),
-                ),
-            )
+        for env in access_tracking_grid:
+            gups_base(bench_base(num=avg_vm_number, balloon=None, env=env))
 
 
 # figure 9b
 def test_ablation_sensitivity_hotness_classification(
-    bench_base, gups_base, avg_vm_number
+    bench_base, gups_base, avg_vm_number, hotness_classification_grid
 ):
     with collect_datapoints(function_name()):
-        for period, thresh in product(
-            erange(128, 65536 + 1, 2),
-            range(5, 35 + 1, 3),
-        ):
-            gups_base(
-                bench_base(
-                    num=avg_vm_number,
-                    balloon=None,
-                    env=dict(
-                        split_period_ms=period,
-                        rtree_split_thresh=thresh,
-                    ),
-                ),
-            )
+        for env in hotness_classification_grid:
+            gups_base(bench_base(num=avg_vm_number, balloon=None, env=env))
 
 
 # table 1
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
+import argparse
+import re
+from pathlib import Path
 
-import drgn
-from drgn.helpers.linux import for_each_node_state
+NODE = Path("/sys/devices/system/node")
+ZONEINFO = Path("/proc/zoneinfo")
 
 
 def eprint(*args, **kwargs):
@@ -9,14 +12,45 @@ def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
 
-prog = drgn.program_from_kernel()
-try:
-    prog.load_debug_info(["/tmp/vmlinux"])
-except drgn.MissingDebugInfoError as e:
-    eprint("Failed to load debug info: %s" % e)
-dram_nid = next(for_each_node_state(prog.constant("N_MEMORY")))
-dram_node = prog["node_data"][dram_nid]
-start_pfn = dram_node.node_start_pfn
-end_pfn = start_pfn + dram_node.node_spanned_pages
+def zoneinfo_pfn_range():
+    """Span of the first memory node from the start and size of its zones"""
+    dram_nid = int(re.split(r"[,-]", (NODE / "has_memory").read_text())[0])
+    spans, nid, spanned = [], None, 0
+    for line in ZONEINFO.read_text().splitlines():
+        if m := re.match(r"Node (\d+), zone", line):
+            nid, spanned = int(m[1]), 0
+        elif nid != dram_nid:
+            continue
+        elif m := re.match(r"\s+spanned\s+(\d+)", line):
+            spanned = int(m[1])
+        elif (m := re.match(r"\s+start_pfn:\s+(\d+)", line)) and spanned:
+            spans.append((int(m[1]), int(m[1]) + spanned))
+    if not spans:
+        return None
+    return min(s for s, _ in spans), max(e for _, e in spans)
 
-print(start_pfn.value_(), end_pfn.value_())
+
+def drgn_pfn_range():
+    import drgn
+    from drgn.helpers.linux import for_each_node_state
+
+    prog = drgn.program_from_kernel()
+    try:
+        prog.load_debug_info(["/tmp/vmlinux"])
+    except drgn.MissingDebugInfoError as e:
+        eprint("Failed to load debug info: %s" % e)
+    dram_nid = next(for_each_node_state(prog.constant("N_MEMORY")))
+    dram_node = prog["node_data"][dram_nid]
+    start_pfn = dram_node.node_start_pfn
+    end_pfn = start_pfn + dram_node.node_spanned_pages
+    return start_pfn.value_(), end_pfn.value_()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the pfn range spanned by the first memory node."
+    )
+    parser.add_argument("--drgn", action="store_true", help="read node_data via drgn")
+    args = parser.parse_args()
+    pfns = None if args.drgn else zoneinfo_pfn_range()
+    print(*(pfns or drgn_pfn_range()))
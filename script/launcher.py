@@ -5,13 +5,58 @@ import os
 import signal
 import sys
 from contextlib import ExitStack, contextmanager
-from enum import Enum
 from errno import EINVAL
-from functools import partial
 from pathlib import Path
 from signal import SIGINT
 from subprocess import DEVNULL, Popen, run
 
+NUMA_BALANCING = Path("/proc/sys/kernel/numa_balancing")
+DEMOTION_ENABLED = Path("/sys/kernel/mm/numa/demotion_enabled")
+DEMOTE_SCALE_FACTOR = Path("/proc/sys/vm/demote_scale_factor")
+DEMETER_TARGETS = Path("/sys/kernel/mm/demeter/targets")
+HTMM = Path("/sys/kernel/mm/htmm")
+DEMETER_MODARGS = (
+    "load_latency_threshold",
+    "load_latency_sample_period",
+    "load_l3_miss_sample_period",
+    "retired_stores_sample_period",
+    "split_period_ms",
+    "throttle_pulse_width_ms",
+    "throttle_pulse_period_ms",
+    "rtree_split_thresh",
+    "rtree_exch_thresh",
+)
+MEMTIS_MODARGS = (
+    "htmm_adaptation_period",
+    "htmm_cooling_period",
+    "htmm_cxl_mode",
+    "htmm_demotion_period_in_ms",
+    "htmm_gamma",
+    "htmm_inst_sample_period",
+    "htmm_mode",
+    "htmm_nowarm",
+    "htmm_promotion_period_in_ms",
+    "htmm_sample_period",
+    "htmm_skip_cooling",
+    "htmm_split_period",
+    "htmm_thres_cooling_alloc",
+    "htmm_thres_hot",
+    "htmm_thres_split",
+    "htmm_util_weight",
+    "ksampled_max_sample_ratio",
+    "ksampled_min_sample_ratio",
+    "ksampled_soft_cpu_quota",
+)
+
+
+def sysfs_write(path: Path, value):
+    """Write a knob with a single unbuffered write(2), skipping the text layer."""
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.write(fd, str(value).encode())
+    finally:
+        os.close(fd)
+
 
 @contextmanager
 def noop(pid: int = -1):
@@ -23,103 +68,66 @@ def noop(pid: int = -1):
 
 @contextmanager
 def demeter(pid: int = -1):
-    procfs = Path("/proc/sys")
-    sysfs = Path("/sys/kernel")
-    targets = Path("/sys/kernel/mm/demeter/targets")
     modprobe = ["modprobe", "demeter_placement"]
-    for modarg in [
-        "load_latency_threshold",
-        "load_latency_sample_period",
-        "load_l3_miss_sample_period",
-        "retired_stores_sample_period",
-        "split_period_ms",
-        "throttle_pulse_width_ms",
-        "throttle_pulse_period_ms",
-        "rtree_split_thresh",
-        "rtree_exch_thresh",
-    ]:
-        exec(f"""if {modarg} := os.getenv("{modarg}", None):
-            {modarg} = int({modarg})
-            modprobe += [f"{{{modarg}=}}"]
-        """)
+    for modarg in DEMETER_MODARGS:
+        if value := os.getenv(modarg):
+            modprobe.append(f"{modarg}={int(value)}")
     try:
-        (procfs / "kernel" / "numa_balancing").write_text("0")
-        (sysfs / "mm" / "numa" / "demotion_enabled").write_text("0")
+        sysfs_write(NUMA_BALANCING, "0")
+        sysfs_write(DEMOTION_ENABLED, "0")
         print(modprobe, file=sys.stderr)
         run(modprobe)
-        (targets / "nr_targets").write_text("3")
-        (targets / "0" / "pid").write_text(str(pid))
+        sysfs_write(DEMETER_TARGETS / "nr_targets", "3")
+        sysfs_write(DEMETER_TARGETS / "0" / "pid", str(pid))
         yield
     finally:
-        (targets / "0" / "pid").write_text("-1")
+        sysfs_write(DEMETER_TARGETS / "0" / "pid", "-1")
+
+
+def syscall(*argtypes):
+    fn = ctypes.CDLL(None, use_errno=True).syscall
+    fn.argtypes = [ctypes.c_long, *argtypes]
+    fn.restype = ctypes.c_long
+    return fn
+
 
+_htmm_start = syscall(ctypes.c_int, ctypes.c_int)
+_htmm_end = syscall(ctypes.c_int)
 
-class Syscall(Enum):
-    @staticmethod
-    def build(nr, *argtypes):
-        fn = ctypes.CDLL(None).syscall
-        fn.argtypes = [ctypes.c_long, *argtypes]
-        fn.restype = ctypes.c_long
-        return partial(fn, nr)
 
-    def __call__(self, *args, **kwargs):
-        return self.value(*args, **kwargs)
+def htmm_start(pid: int, flags: int) -> int:
+    return _htmm_start(449, pid, flags)
 
-    htmm_start = build(449, ctypes.c_int, ctypes.c_int)
-    htmm_end = build(450, ctypes.c_int)
+
+def htmm_end(pid: int) -> int:
+    return _htmm_end(450, pid)
 
 
 @contextmanager
 def memtis(pid: int = -1):
     """Enable HTMM globally by default."""
-    procfs = Path("/proc/sys")
-    sysfs = Path("/sys/kernel")
     modargs = dict()
-    for modarg in [
-        "htmm_adaptation_period",
-        "htmm_cooling_period",
-        "htmm_cxl_mode",
-        "htmm_demotion_period_in_ms",
-        "htmm_gamma",
-        "htmm_inst_sample_period",
-        "htmm_mode",
-        "htmm_nowarm",
-        "htmm_promotion_period_in_ms",
-        "htmm_sample_period",
-        "htmm_skip_cooling",
-        "htmm_split_period",
-        "htmm_thres_cooling_alloc",
-        "htmm_thres_hot",
-        "htmm_thres_split",
-        "htmm_util_weight",
-        "ksampled_max_sample_ratio",
-        "ksampled_min_sample_ratio",
-        "ksampled_soft_cpu_quota",
-    ]:
-        exec(f"""if {modarg} := os.getenv("{modarg}", None):
-            {modarg} = int({modarg})
-            modargs["{modarg}"] = {modarg}
-        """)
+    for modarg in MEMTIS_MODARGS:
+        if value := os.getenv(modarg):
+            modargs[modarg] = int(value)
     try:
-        (procfs / "kernel" / "numa_balancing").write_text("0")
-        (sysfs / "mm" / "numa" / "demotion_enabled").write_text("0")
+        sysfs_write(NUMA_BALANCING, "0")
+        sysfs_write(DEMOTION_ENABLED, "0")
         for key, value in modargs.items():
-            (sysfs / "mm" / "htmm" / key).write_text(str(value))
-        Syscall.htmm_start(pid, 0)
+            sysfs_write(HTMM / key, str(value))
+        htmm_start(pid, 0)
         yield
     finally:
-        Syscall.htmm_end(pid)
+        htmm_end(pid)
 
 
 @contextmanager
 def nomad(pid: int = -1):
-    procfs = Path("/proc/sys")
-    sysfs = Path("/sys/kernel")
-    debugfs = sysfs / "debug"
+    debugfs = Path("/sys/kernel/debug")
     try:
-        (procfs / "kernel" / "numa_balancing").write_text("2")
-        (sysfs / "mm" / "numa" / "demotion_enabled").write_text("1")
-        (procfs / "vm" / "demote_scale_factor").write_text("1000")
+        sysfs_write(NUMA_BALANCING, "2")
+        sysfs_write(DEMOTION_ENABLED, "1")
+        sysfs_write(DEMOTE_SCALE_FACTOR, "1000")
         # (debugfs / "sched" / "numa_balancing" / "scan_period_min_ms").write_text("1000")
         # (debugfs / "sched" / "numa_balancing" / "scan_period_max_ms").write_text("100000")
         # (debugfs / "sched" / "numa_balancing" / "scan_size_mb").write_text("256")
@@ -136,13 +144,11 @@ def nomad(pid: int = -1):
 
 @contextmanager
 def tpp(pid: int = -1):
-    procfs = Path("/proc/sys")
-    sysfs = Path("/sys/kernel")
-    debugfs = sysfs / "debug"
+    debugfs = Path("/sys/kernel/debug")
     try:
-        (procfs / "kernel" / "numa_balancing").write_text("2")
-        (sysfs / "mm" / "numa" / "demotion_enabled").write_text("1")
-        (procfs / "vm" / "demote_scale_factor").write_text("1000")
+        sysfs_write(NUMA_BALANCING, "2")
+        sysfs_write(DEMOTION_ENABLED, "1")
+        sysfs_write(DEMOTE_SCALE_FACTOR, "1000")
         # (debugfs / "sched" / "numa_balancing" / "scan_period_min_ms").write_text("1000")
         # (debugfs / "sched" / "numa_balancing" / "scan_period_max_ms").write_text("100000")
         # (debugfs / "sched" / "numa_balancing" / "scan_size_mb").write_text("256")
@@ -157,9 +163,10 @@ def tpp(pid: int = -1):
 
 @contextmanager
 def daemon(args, label: str | None = None, out=Path("/out"), sudo=True):
-    stdout = (out / (label or args[0])).with_suffix(".log")
-    stderr = (out / (label or args[0])).with_suffix(".err")
-    with open(stdout, "w") as stdout, open(stderr, "w") as stderr:
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC
+    stdout = os.open((out / (label or args[0])).with_suffix(".log"), flags, 0o644)
+    stderr = os.open((out / (label or args[0])).with_suffix(".err"), flags, 0o644)
+    try:
         p = Popen(
             args,
             stdin=DEVNULL,
@@ -167,13 +174,17 @@ def daemon(args, label: str | None = None, out=Path("/out"), sudo=True):
             stderr=stderr,
             preexec_fn=os.setsid if sudo else None,
         )
-        try:
-            yield p
-        finally:
-            os.killpg(os.getpgid(p.pid), signal.SIGINT) if sudo else p.send_signal(
-                signal.SIGINT
-            )
-            p.wait()
+    finally:
+        # Popen has dup2'ed them into the child
+        os.close(stdout)
+        os.close(stderr)
+    try:
+        yield p
+    finally:
+        os.killpg(os.getpgid(p.pid), signal.SIGINT) if sudo else p.send_signal(
+            signal.SIGINT
+        )
+        p.wait()
 
 
 @contextmanager
@@ -204,9 +215,10 @@ def parent(ctxfn, child: int):
     sys.exit(err)
 
 
-def child(file, *args):
-    print(f"execvp({file=}, {args=}")
-    os.execvp(file, args)
+def child(file, *args) -> int:
+    print(f"posix_spawnp({file=}, {args=}")
+    # avoid copying the page tables of the interpreter just to exec
+    return os.posix_spawnp(file, args, os.environ)
 
 
 @contextmanager
@@ -216,11 +228,11 @@ def cgroup(pid, memtis: bool = False):
     try:
         group.mkdir(parents=True, exist_ok=True)
         if memtis:
-            (group / "memory.htmm_enabled").write_text("enabled")
-        (group / "cgroup.procs").write_text(str(pid))
+            sysfs_write(group / "memory.htmm_enabled", "enabled")
+        sysfs_write(group / "cgroup.procs", str(pid))
         yield
     finally:
-        (root / "cgroup.procs").write_text(str(pid))
+        sysfs_write(root / "cgroup.procs", str(pid))
         group.rmdir()
 
 
@@ -244,5 +256,4 @@ if __name__ == "__main__":
         if not child_args:
             parser.print_help()
             sys.exit(EINVAL)
-        pid = os.fork()
-        parent(ctxfn, pid) if pid > 0 else child(child_args[0], *child_args)
+        parent(ctxfn, child(child_args[0], *child_args))
@@ -1,450 +1,363 @@
 #!/usr/bin/env python3
-import json
+import hashlib
 import logging
+import mmap
+import os
 import re
-from dataclasses import InitVar, asdict, dataclass, field
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import cache
 from pathlib import Path
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, NamedTuple, Set, Tuple
 
 import fire
-import jq
 import pandas as pd
 
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 LOGGER = logging.getLogger(__name__)
 FORMAT = "%(asctime)s %(levelname)-8s %(name)-15s %(message)s"
+DIGITS = re.compile(rb"\d+")
 FLOAT = r"[+-]?(\d*\.\d+|\d+\.)([eE][+-]?\d+)?"
 KERNEL = r"\d+\.\d+\.\d+(-\w+)?\+?"
-TRANSFORM = jq.compile("""
-.vms
-| map(
-    .metrics
-    | map({ (.key): (.value) })
-    | add
-  )
-""")
-
-
-@dataclass
-class Metric:
+# metrics are numbers, except for the labels and categories below
+LABELS = ("runid", "vmid")
+DTYPES = dict(vmnum="int64", kernel="category", design="category", balloon="category")
+
+
+def read_log(file: Path) -> bytes | mmap.mmap:
+    """The content of a log mapped read-only, empty if it does not exist."""
+    try:
+        with open(file, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # empty files cannot be mapped
+        return b""
+    except OSError as e:
+        LOGGER.error(e)
+        return b""
+
+
+@cache
+def compile_regex(regex: str) -> re.Pattern[bytes]:
+    # logs are searched as raw bytes, only the matched groups are decoded
+    return re.compile(regex.encode())
+
+
+def decode(value: bytes | None) -> str | None:
+    return value.decode() if value is not None else None
+
+
+_DESIGN_MAP = dict(tpp="TPP", nomad="Nomad", memtis="Memtis", demeter="Demeter")
+_BALLOON_MAP = dict(demeter="Demeter Balloon", virtio="VirtIO Balloon")
+
+
+def _design(d: Dict) -> str | None:
+    return _DESIGN_MAP.get(d["design"], d["design"])
+
+
+def _balloon(d: Dict) -> str | None:
+    return _BALLOON_MAP.get(d["balloon"], d["balloon"])
+
+
+def _elapsed(d: Dict) -> float:
+    """h:mm:ss or m:ss in seconds"""
+    return float(d["hh"] or 0) * 3600 + float(d["mm"]) * 60 + float(d["ss"])
+
+
+class MetricSpec(NamedTuple):
+    """Where to find a metric in the logs of a vm.
+
+    The pattern is either a regex, whose named group `key` is the value unless fn
+    converts the whole groupdict; a token the digits of the value follow; or None
+    for a field of a "name value" log like vmstat.
+    The default is used if the value is not found.
+    """
+
     key: str
-    value: Any
+    log: str
+    pattern: re.Pattern[bytes] | bytes | None = None
+    fn: Callable[[Dict], Any] | None = None
+    default: Any = None
 
 
-@dataclass
-class RegexMetric(Metric):
-    """The value field from the parent is used as the default if no match is found."""
+ELAPSED = r"Elapsed \(wall clock\) time \(h:mm:ss or m:ss\): ((?P<hh>\d+):)?(?P<mm>\d+):(?P<ss>\d+\.?\d*)"
+GUPS_FINAL = rf"iteration (?P<label>last) final (?P<gups_throughput>{FLOAT}) elapsed (?P<gups_elapsed>{FLOAT})s"
+GUPS_DRAM_RATIO = rf"iteration (?P<label>last) dram portion per gb: \[(?P<dram_ratio_first_gib>{FLOAT})(, {FLOAT})*, (?P<dram_ratio_last_gib>{FLOAT})\]"
+# created config=0x1cd config1=0x30 sample_period=127
+LOAD_LATENCY = r"created config=0x1cd config1=(?P<load_latency_threshold>0x[\da-f]+) sample_period=(?P<load_latency_sample_period>\d+)"
+# the regexes are given as str and compiled once, when the module is loaded
+_METRIC_SPECS = tuple(
+    spec._replace(pattern=compile_regex(spec.pattern))
+    if isinstance(spec.pattern, str)
+    else spec
+    for spec in [
+        MetricSpec(
+            "kernel",
+            "cloud-hypervisor.stdout",
+            rf"Linux version (?P<kernel>{KERNEL})",
+        ),
+        MetricSpec(
+            "design",
+            "cloud-hypervisor.stdout",
+            r"Linux version (?P<kernel>\d+\.\d+\.\d+(-(?P<design>\w+))?\+?)",
+            _design,
+        ),
+        MetricSpec(
+            "balloon",
+            "dmesg",
+            r"initcall init_module\+0x0/0x1000 \[(?P<balloon>\w+)_balloon\]",
+            _balloon,
+            default="Static",
+        ),
+        MetricSpec("pgmigrate_success", "vmstat"),
+        MetricSpec("folio_exchange_success", "vmstat"),
+        MetricSpec("folio_exchange_failed", "vmstat"),
+        MetricSpec("pebs_nr_sampled", "vmstat"),
+        MetricSpec("pebs_nr_sampled_fmem", "vmstat"),
+        MetricSpec("pebs_nr_sampled_smem", "vmstat"),
+        MetricSpec("gups_throughput", "gups.log", GUPS_FINAL),
+        MetricSpec("gups_elapsed", "gups.log", GUPS_FINAL),
+        MetricSpec("exit_status", "gups.err", b"Exit status: "),
+        MetricSpec("percent_of_cpu", "gups.err", b"Percent of CPU this job got: "),
+        MetricSpec(
+            "user_time", "gups.err", rf"User time \(seconds\): (?P<user_time>{FLOAT})"
+        ),
+        MetricSpec(
+            "system_time",
+            "gups.err",
+            rf"System time \(seconds\): (?P<system_time>{FLOAT})",
+        ),
+        *(
+            MetricSpec(workload, f"{workload}.err", ELAPSED, _elapsed)
+            for workload in [
+                "gups",
+                "xsbench",
+                "graph500",
+                "pagerank",
+                "liblinear",
+                "bwaves",
+                "btree",
+                "silo",
+            ]
+        ),
+        MetricSpec(
+            "memtis_cpu_usage",
+            "cloud-hypervisor.stdout",
+            r"total runtime: (?P<memtis_runtime>\d+) ns, total cputime: (?P<memtis_cputime>\d+) us, cpu usage: (?P<memtis_cpu_usage>\d+)",
+        ),
+        MetricSpec("dram_ratio_first_gib", "gups.log", GUPS_DRAM_RATIO),
+        MetricSpec("dram_ratio_last_gib", "gups.log", GUPS_DRAM_RATIO),
+        MetricSpec(
+            "local_dram_miss_sample_period",
+            "cloud-hypervisor.stdout",
+            b"created config=0x1d3 sample_period=",
+        ),
+        MetricSpec(
+            "load_latency_sample_period", "cloud-hypervisor.stdout", LOAD_LATENCY
+        ),
+        MetricSpec(
+            "load_latency_threshold",
+            "cloud-hypervisor.stdout",
+            LOAD_LATENCY,
+            lambda d: int(d["load_latency_threshold"], 0),
+        ),
+        MetricSpec(
+            "retired_stores_sample_period",
+            "cloud-hypervisor.stdout",
+            b"created config=0x82d0 sample_period=",
+        ),
+        *(
+            MetricSpec(
+                key,
+                "cloud-hypervisor.stdout",
+                rf"{name}=(?P<{name}_ns>\d+) permyriad=(?P<util_{name}>\d+)",
+            )
+            for name in [
+                "overflow_handler",
+                "policy",
+                "migration",
+                "perf_prepare",
+                "split",
+            ]
+            for key in [f"util_{name}", f"{name}_ns"]
+        ),
+        MetricSpec("ptea_scan_ns", "vmstat"),
+        MetricSpec("ptea_scanned", "vmstat"),
+        MetricSpec("lru_rotate_ns", "vmstat"),
+        MetricSpec("demote_ns", "vmstat"),
+        MetricSpec("hint_fault_ns", "vmstat"),
+        MetricSpec("promote_ns", "vmstat"),
+        MetricSpec("sampling_ns", "vmstat"),
+        MetricSpec("ptext_ns", "vmstat"),
+        MetricSpec("split_period_ms", "gups.err", b"split_period_ms="),
+        MetricSpec("rtree_split_thresh", "gups.err", b"rtree_split_thresh="),
+        MetricSpec("nr_tlb_remote_flush", "vmstat"),
+        MetricSpec("nr_tlb_local_flush_all", "vmstat"),
+        MetricSpec("nr_tlb_local_flush_one", "vmstat"),
+        # the kvm debugfs counters hold a single number
+        MetricSpec("tlb_flush", "kvm/tlb_flush", b""),
+        MetricSpec("remote_tlb_flush", "kvm/remote_tlb_flush", b""),
+        *(
+            MetricSpec(
+                f"silo_{p}_latency",
+                "silo.err",
+                rf"{p}_latency: (?P<silo_{p}_latency>\d+.?\d*) ns",
+            )
+            for p in ["p50", "p90", "p95", "p99"]
+        ),
+    ]
+)
 
-    file: InitVar[Path]
-    regex: InitVar[str]
 
-    def __post_init__(self, file, regex):
-        if not file.exists():
-            # LOGGER.warning(f"{file} does not exist")
-            return
-        pattern = re.compile(regex)
+def compile_databases(specs) -> Dict[str, Tuple[Any, Dict[re.Pattern[bytes], int]]]:
+    """One hyperscan database per log, matching all the regexes searched in it."""
+    patterns: Dict[str, Dict[re.Pattern[bytes], int]] = {}
+    for spec in specs:
+        if isinstance(spec.pattern, re.Pattern):
+            ids = patterns.setdefault(spec.log, {})
+            ids.setdefault(spec.pattern, len(ids))
+    databases = {}
+    for name, ids in patterns.items():
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
         try:
-            if m := pattern.search(file.read_text()):
-                self.value = m.group(self.key)
-        except OSError as e:
-            LOGGER.error(e)
+            db.compile(
+                expressions=[pattern.pattern for pattern in ids],
+                ids=list(ids.values()),
+                elements=len(ids),
+                flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(ids),
+            )
+        except hyperscan.error as e:
+            LOGGER.warning(f"{name}: {e}, falling back to re")
+            continue
+        databases[name] = (db, ids)
+    return databases
 
 
-@dataclass
-class FnRegexMetric(RegexMetric):
-    """The value field from the parent is used as the default if no match is found."""
+# hyperscan databases of the regexes of each log, with the ids of the regexes
+_LOG_DATABASES = compile_databases(_METRIC_SPECS) if hyperscan else {}
 
-    fn: InitVar[Callable[[Dict], Any]]
 
-    def __post_init__(self, file, regex, fn):
-        if not file.exists():
-            # LOGGER.warning(f"{file} does not exist")
-            return
-        pattern = re.compile(regex)
-        try:
-            if m := pattern.search(file.read_text()):
-                self.value = fn(m.groupdict())
-        except OSError as e:
-            LOGGER.error(e)
+class Log:
+    """A log of a vm, shared by all the metrics extracted from it."""
 
+    __slots__ = ("name", "buf", "_matches", "_hits", "_fields")
 
-@dataclass
-class ElapsedMetric(FnRegexMetric):
-    regex: InitVar[str] = (
-        r"Elapsed \(wall clock\) time \(h:mm:ss or m:ss\): ((?P<hh>\d+):)?(?P<mm>\d+):(?P<ss>\d+\.?\d*)"
-    )
-    fn: InitVar[Callable[[Dict], Any]] = lambda d: sum(
-        map(lambda k, r: float(d.get(k) or 0) * r, ["hh", "mm", "ss"], [3600, 60, 1])
-    )
+    def __init__(self, name: str, buf: bytes | mmap.mmap):
+        self.name = name
+        self.buf = buf
+        self._matches: Dict[re.Pattern[bytes], re.Match[bytes] | None] = {}
+        self._hits: Set[int] | None = None
+        self._fields: Dict[str, str] | None = None
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+
+    def _scan(self, db) -> Set[int]:
+        # a single pass over the log finds which of its regexes match at all
+        if self._hits is None:
+            hits = self._hits = set()
+            # scan the mapping in place, released before the log is closed
+            with memoryview(self.buf) as view:
+                db.scan(view, match_event_handler=lambda id, *_: hits.add(id))
+        return self._hits
+
+    def search(self, pattern: re.Pattern[bytes]) -> re.Match[bytes] | None:
+        """Like pattern.search, once for all the metrics sharing the pattern."""
+        if pattern not in self._matches:
+            db, ids = _LOG_DATABASES.get(self.name, (None, None))
+            if db and ids[pattern] not in self._scan(db):
+                self._matches[pattern] = None
+            else:
+                self._matches[pattern] = pattern.search(self.buf)
+        return self._matches[pattern]
+
+    def find(self, token: bytes) -> str | None:
+        """The digits right after a fixed token, found without running a regex."""
+        if (i := self.buf.find(token)) < 0:
+            return None
+        m = DIGITS.match(self.buf, i + len(token))
+        return m.group().decode() if m else None
+
+    def fields(self) -> Dict[str, str]:
+        """The "name value" pairs of the log, one per line."""
+        if self._fields is None:
+            if isinstance(self.buf, mmap.mmap):
+                # read the lines off the mapping, only they are copied and decoded
+                self.buf.seek(0)
+                lines = iter(self.buf.readline, b"")
+            else:
+                lines = self.buf.splitlines()
+            self._fields = {}
+            for line in lines:
+                key, sep, value = line.rstrip(b"\n").partition(b" ")
+                if sep:
+                    self._fields[key.decode()] = value.decode()
+        return self._fields
 
+    def extract(self, spec: MetricSpec) -> Any:
+        if spec.pattern is None:
+            value = self.fields().get(spec.key)
+        elif isinstance(spec.pattern, bytes):
+            value = self.find(spec.pattern)
+        elif not (m := self.search(spec.pattern)):
+            value = None
+        elif spec.fn:
+            value = spec.fn({k: decode(v) for k, v in m.groupdict().items()})
+        else:
+            value = decode(m.group(spec.key))
+        return spec.default if value is None else value
 
-@dataclass
+
+@dataclass(slots=True)
 class VmMetrics:
     runid: Path
     vmid: Path
     vmnum: int
-    metrics: List[Metric] = field(init=False)
+    metrics: Dict[str, Any] = field(init=False)
 
     def __post_init__(self):
-        self.metrics = [
-            Metric(key="runid", value=self.runid.name),
-            Metric(key="vmid", value=self.vmid.name),
-            Metric(key="vmnum", value=str(self.vmnum)),
-            RegexMetric(
-                key="kernel",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=rf"Linux version (?P<kernel>{KERNEL})",
-            ),
-            FnRegexMetric(
-                key="design",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=rf"Linux version (?P<kernel>\d+\.\d+\.\d+(-(?P<design>\w+))?\+?)",
-                fn=lambda d: dict(
-                    tpp="TPP",
-                    nomad="Nomad",
-                    memtis="Memtis",
-                    demeter="Demeter",
-                ).get(d["design"], d["design"]),
-            ),
-            FnRegexMetric(
-                key="balloon",
-                value="Static",
-                file=self.vmid / "dmesg",
-                regex=r"initcall init_module\+0x0/0x1000 \[(?P<balloon>\w+)_balloon\]",
-                fn=lambda d: dict(
-                    demeter="Demeter Balloon",
-                    virtio="VirtIO Balloon",
-                ).get(d["balloon"], d["balloon"]),
-            ),
-            RegexMetric(
-                key="pgmigrate_success",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"pgmigrate_success (?P<pgmigrate_success>\d+)",
-            ),
-            RegexMetric(
-                key="folio_exchange_success",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"folio_exchange_success (?P<folio_exchange_success>\d+)",
-            ),
-            RegexMetric(
-                key="folio_exchange_failed",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"folio_exchange_failed (?P<folio_exchange_failed>\d+)",
-            ),
-            RegexMetric(
-                key="pebs_nr_sampled",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"pebs_nr_sampled (?P<pebs_nr_sampled>\d+)",
-            ),
-            RegexMetric(
-                key="pebs_nr_sampled_fmem",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"pebs_nr_sampled_fmem (?P<pebs_nr_sampled_fmem>\d+)",
-            ),
-            RegexMetric(
-                key="pebs_nr_sampled_smem",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"pebs_nr_sampled_smem (?P<pebs_nr_sampled_smem>\d+)",
-            ),
-            RegexMetric(
-                key="gups_throughput",
-                value=None,
-                file=self.vmid / "gups.log",
-                regex=rf"iteration (?P<label>last) final (?P<gups_throughput>{FLOAT}) elapsed (?P<gups_elapsed>{FLOAT})s",
-            ),
-            RegexMetric(
-                key="gups_elapsed",
-                value=None,
-                file=self.vmid / "gups.log",
-                regex=rf"iteration (?P<label>last) final (?P<gups_throughput>{FLOAT}) elapsed (?P<gups_elapsed>{FLOAT})s",
-            ),
-            RegexMetric(
-                key="exit_status",
-                value=None,
-                file=self.vmid / "gups.err",
-                regex=r"Exit status: (?P<exit_status>\d+)",
-            ),
-            RegexMetric(
-                key="percent_of_cpu",
-                value=None,
-                file=self.vmid / "gups.err",
-                regex=r"Percent of CPU this job got: (?P<percent_of_cpu>\d+)%",
-            ),
-            RegexMetric(
-                key="user_time",
-                value=None,
-                file=self.vmid / "gups.err",
-                regex=rf"User time \(seconds\): (?P<user_time>{FLOAT})",
-            ),
-            RegexMetric(
-                key="system_time",
-                value=None,
-                file=self.vmid / "gups.err",
-                regex=rf"System time \(seconds\): (?P<system_time>{FLOAT})",
-            ),
-            ElapsedMetric(key="gups", value=None, file=self.vmid / "gups.err"),
-            ElapsedMetric(key="xsbench", value=None, file=self.vmid / "xsbench.err"),
-            ElapsedMetric(key="graph500", value=None, file=self.vmid / "graph500.err"),
-            ElapsedMetric(key="pagerank", value=None, file=self.vmid / "pagerank.err"),
-            ElapsedMetric(
-                key="liblinear", value=None, file=self.vmid / "liblinear.err"
-            ),
-            ElapsedMetric(key="bwaves", value=None, file=self.vmid / "bwaves.err"),
-            ElapsedMetric(key="btree", value=None, file=self.vmid / "btree.err"),
-            ElapsedMetric(key="silo", value=None, file=self.vmid / "silo.err"),
-            RegexMetric(
-                key="memtis_cpu_usage",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"total runtime: (?P<memtis_runtime>\d+) ns, total cputime: (?P<memtis_cputime>\d+) us, cpu usage: (?P<memtis_cpu_usage>\d+)",
-            ),
-            RegexMetric(
-                key="dram_ratio_first_gib",
-                value=None,
-                file=self.vmid / "gups.log",
-                regex=rf"iteration (?P<label>last) dram portion per gb: \[(?P<dram_ratio_first_gib>{FLOAT})(, {FLOAT})*, (?P<dram_ratio_last_gib>{FLOAT})\]",
-            ),
-            RegexMetric(
-                key="dram_ratio_last_gib",
-                value=None,
-                file=self.vmid / "gups.log",
-                regex=rf"iteration (?P<label>last) dram portion per gb: \[(?P<dram_ratio_first_gib>{FLOAT})(, {FLOAT})*, (?P<dram_ratio_last_gib>{FLOAT})\]",
-            ),
-            RegexMetric(
-                key="local_dram_miss_sample_period",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"created config=0x1d3 sample_period=(?P<local_dram_miss_sample_period>\d+)",
-            ),
-            RegexMetric(
-                key="load_latency_sample_period",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                # created config=0x1cd config1=0x30 sample_period=127
-                regex=r"created config=0x1cd config1=(?P<load_latency_threshold>0x[\da-f]+) sample_period=(?P<load_latency_sample_period>\d+)",
-            ),
-            FnRegexMetric(
-                key="load_latency_threshold",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"created config=0x1cd config1=(?P<load_latency_threshold>0x[\da-f]+) sample_period=(?P<load_latency_sample_period>\d+)",
-                fn=lambda d: int(d["load_latency_threshold"], 0),
-            ),
-            RegexMetric(
-                key="retired_stores_sample_period",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"created config=0x82d0 sample_period=(?P<retired_stores_sample_period>\d+)",
-            ),
-            RegexMetric(
-                key="util_overflow_handler",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"overflow_handler=(?P<overflow_handler_ns>\d+) permyriad=(?P<util_overflow_handler>\d+)",
-            ),
-            RegexMetric(
-                key="overflow_handler_ns",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"overflow_handler=(?P<overflow_handler_ns>\d+) permyriad=(?P<util_overflow_handler>\d+)",
-            ),
-            RegexMetric(
-                key="util_policy",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"policy=(?P<policy_ns>\d+) permyriad=(?P<util_policy>\d+)",
-            ),
-            RegexMetric(
-                key="policy_ns",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"policy=(?P<policy_ns>\d+) permyriad=(?P<util_policy>\d+)",
-            ),
-            RegexMetric(
-                key="util_migration",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"migration=(?P<migration_ns>\d+) permyriad=(?P<util_migration>\d+)",
-            ),
-            RegexMetric(
-                key="migration_ns",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"migration=(?P<migration_ns>\d+) permyriad=(?P<util_migration>\d+)",
-            ),
-            RegexMetric(
-                key="util_perf_prepare",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"perf_prepare=(?P<perf_prepare_ns>\d+) permyriad=(?P<util_perf_prepare>\d+)",
-            ),
-            RegexMetric(
-                key="perf_prepare_ns",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"perf_prepare=(?P<perf_prepare_ns>\d+) permyriad=(?P<util_perf_prepare>\d+)",
-            ),
-            RegexMetric(
-                key="util_split",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"split=(?P<split_ns>\d+) permyriad=(?P<util_split>\d+)",
-            ),
-            RegexMetric(
-                key="split_ns",
-                value=None,
-                file=self.vmid / "cloud-hypervisor.stdout",
-                regex=r"split=(?P<split_ns>\d+) permyriad=(?P<util_split>\d+)",
-            ),
-            RegexMetric(
-                key="ptea_scan_ns",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"ptea_scan_ns (?P<ptea_scan_ns>\d+)",
-            ),
-            RegexMetric(
-                key="ptea_scanned",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"ptea_scanned (?P<ptea_scanned>\d+)",
-            ),
-            RegexMetric(
-                key="lru_rotate_ns",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"lru_rotate_ns (?P<lru_rotate_ns>\d+)",
-            ),
-            RegexMetric(
-                key="demote_ns",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"demote_ns (?P<demote_ns>\d+)",
-            ),
-            RegexMetric(
-                key="hint_fault_ns",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"hint_fault_ns (?P<hint_fault_ns>\d+)",
-            ),
-            RegexMetric(
-                key="promote_ns",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"promote_ns (?P<promote_ns>\d+)",
-            ),
-            RegexMetric(
-                key="sampling_ns",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"sampling_ns (?P<sampling_ns>\d+)",
-            ),
-            RegexMetric(
-                key="ptext_ns",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"ptext_ns (?P<ptext_ns>\d+)",
-            ),
-            RegexMetric(
-                key="split_period_ms",
-                value=None,
-                file=self.vmid / "gups.err",
-                regex=r"split_period_ms=(?P<split_period_ms>\d+)",
-            ),
-            RegexMetric(
-                key="rtree_split_thresh",
-                value=None,
-                file=self.vmid / "gups.err",
-                regex=r"rtree_split_thresh=(?P<rtree_split_thresh>\d+)",
-            ),
-            RegexMetric(
-                key="nr_tlb_remote_flush",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"nr_tlb_remote_flush (?P<nr_tlb_remote_flush>\d+)",
-            ),
-            RegexMetric(
-                key="nr_tlb_local_flush_all",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"nr_tlb_local_flush_all (?P<nr_tlb_local_flush_all>\d+)",
-            ),
-            RegexMetric(
-                key="nr_tlb_local_flush_one",
-                value=None,
-                file=self.vmid / "vmstat",
-                regex=r"nr_tlb_local_flush_one (?P<nr_tlb_local_flush_one>\d+)",
-            ),
-            RegexMetric(
-                key="tlb_flush",
-                value=None,
-                file=self.vmid / "kvm" / "tlb_flush",
-                regex=r"(?P<tlb_flush>\d+)",
-            ),
-            RegexMetric(
-                key="remote_tlb_flush",
-                value=None,
-                file=self.vmid / "kvm" / "remote_tlb_flush",
-                regex=r"(?P<remote_tlb_flush>\d+)",
-            ),
-            RegexMetric(
-                key="silo_p50_latency",
-                value=None,
-                file=self.vmid / "silo.err",
-                regex=r"p50_latency: (?P<silo_p50_latency>\d+.?\d*) ns",
-            ),
-            RegexMetric(
-                key="silo_p90_latency",
-                value=None,
-                file=self.vmid / "silo.err",
-                regex=r"p90_latency: (?P<silo_p90_latency>\d+.?\d*) ns",
-            ),
-            RegexMetric(
-                key="silo_p95_latency",
-                value=None,
-                file=self.vmid / "silo.err",
-                regex=r"p95_latency: (?P<silo_p95_latency>\d+.?\d*) ns",
-            ),
-            RegexMetric(
-                key="silo_p99_latency",
-                value=None,
-                file=self.vmid / "silo.err",
-                regex=r"p99_latency: (?P<silo_p99_latency>\d+.?\d*) ns",
-            ),
-        ]
-
-
-@dataclass
+        # most logs hold many metrics, read each of them only once
+        logs: Dict[str, Log] = {}
+        self.metrics = dict(
+            runid=self.runid.name, vmid=self.vmid.name, vmnum=self.vmnum
+        )
+        for spec in _METRIC_SPECS:
+            if (log := logs.get(spec.log)) is None:
+                log = logs[spec.log] = Log(spec.log, read_log(self.vmid / spec.log))
+            self.metrics[spec.key] = log.extract(spec)
+        for log in logs.values():
+            log.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.metrics
+
+
+@dataclass(slots=True)
 class RunMetrics:
     runid: Path
-    vms: List[VmMetrics] = field(init=False)
-    metrics: List[Metric] = field(init=False)
+    vms: List[VmMetrics] = field(default_factory=list)
 
-    def __post_init__(self):
-        vmnum = sum(
-            1
-            for _ in filter(
-                lambda p: p.is_dir() and p.name.isdigit(), self.runid.iterdir()
-            )
-        )
-        self.vms = []
-        for vmfolder in self.runid.iterdir():
-            if vmfolder.is_dir() and vmfolder.name.isdigit():
-                self.vms.append(VmMetrics(runid=self.runid, vmid=vmfolder, vmnum=vmnum))
-        self.metrics = []
+    def vm_folders(self) -> List[Path]:
+        # dirents carry their type, no stat is needed to tell folders apart
+        with os.scandir(self.runid) as it:
+            return [
+                self.runid / e.name for e in it if e.name.isdigit() and e.is_dir()
+            ]
 
 
-class PathEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Path):
-            return str(o)
-        return super().default(o)
+def cache_file(jobs) -> Path:
+    """The parquet file caching the parse of the vm folders, as of their mtime."""
+    key = hashlib.blake2b(digest_size=16)
+    key.update(str(Path(__file__).stat().st_mtime_ns).encode())
+    for _, vmid, vmnum in jobs:
+        key.update(f"{vmid.resolve()}:{vmid.stat().st_mtime_ns}:{vmnum}\n".encode())
+    return Path(tempfile.gettempdir()) / f"parselog-{key.hexdigest()}.parquet"
 
 
 def parse_log(start=0, stop=None, dir=Path("bench/archive")):
@@ -453,18 +366,38 @@ def parse_log(start=0, stop=None, dir=Path("bench/archive")):
     Then report(-4) means last run, and report(-8, -4) means the second last run.
     """
     # find the newest num folders under archive/
-    newest = sorted(filter(Path.is_dir, Path(dir).iterdir()), key=lambda x: x.name)[
-        start:stop
-    ]
-    data = []
-    for folder in newest:
-        metrics = asdict(RunMetrics(folder))
-        metrics = TRANSFORM.input(
-            json.loads(json.dumps(metrics, cls=PathEncoder))
-        ).first()
-        data.extend(metrics)
-    # print(json.dumps(data))
-    return pd.json_normalize(data)
+    with os.scandir(dir) as it:
+        entries = sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+    newest = [Path(e.path) for e in entries[start:stop]]
+    runs = {folder: RunMetrics(folder) for folder in newest}
+    jobs = []
+    for run in runs.values():
+        vmids = run.vm_folders()
+        jobs += [(run.runid, vmid, len(vmids)) for vmid in vmids]
+    cache = cache_file(jobs)
+    try:
+        return pd.read_parquet(cache)
+    except FileNotFoundError:
+        pass
+    except ImportError as e:
+        # neither pyarrow nor fastparquet is installed
+        LOGGER.info(e)
+        cache = None
+    # vms are parsed independently of each other, spread them over all cores
+    with ProcessPoolExecutor() as ex:
+        for vm in ex.map(VmMetrics, *zip(*jobs), chunksize=8):
+            runs[vm.runid].vms.append(vm)
+    data = [vm.to_dict() for run in runs.values() for vm in run.vms]
+    df = pd.DataFrame.from_records(data)
+    df = df.astype(
+        {key: DTYPES.get(key, "float64") for key in df.columns if key not in LABELS}
+    )
+    if cache:
+        # concurrent parses of the same folders must not see a partial file
+        partial = cache.with_suffix(f".{os.getpid()}")
+        df.to_parquet(partial)
+        partial.replace(cache)
+    return df
 
 
 def main(**kwargs):
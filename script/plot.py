@@ -1,12 +1,14 @@
 import pandas as pd
 import altair as alt
 import fire
+from functools import cache
 from pathlib import Path
 
 
 from parse_log import parse_log
-from altair_theme import jlhu_theme, COLUMN_WIDTH, DEFAULT_HEIGHT
+from altair_theme import enable_jlhu_theme, COLUMN_WIDTH, DEFAULT_HEIGHT
 
+enable_jlhu_theme()
 
 WORKLOADS = [
     "liblinear",
@@ -36,10 +38,16 @@ def find_workload_dir(base, keyword):
     return None
 
 
+@cache
+def parse_dir(dir):
+    # workloads sharing a folder reuse its parse, callers must not modify it
+    return parse_log(dir=dir)
+
+
 def read_csv(data_dir, workload):
     dir = find_workload_dir(data_dir, workload)
     data = (
-        parse_log(dir=dir)
+        parse_dir(dir.resolve())
         .rename(columns={workload: "elapsed"})
         .loc[:, ("vmnum", "design", "elapsed")]
     )
@@ -51,17 +59,17 @@ def preprocess(guest_log_dir, host_log_dir=None):
     for workload in WORKLOADS:
         guest = read_csv(guest_log_dir, workload)
         if host_log_dir:
-            host = read_csv(host_log_dir, workload).replace("TPP", "TPP-H")
+            host = read_csv(host_log_dir, workload)
+            host["design"] = host["design"].cat.rename_categories({"TPP": "TPP-H"})
             data = pd.concat([guest, host], ignore_index=True)
         else:
             data = guest
         data["workload"] = workload
-        agg = (
-            data.groupby(["vmnum", "design"])
-            .mean("elapsed")
-            .groupby(level=0)
-            .agg(["min", "max"])["elapsed"]
-        )
+        # only observed (vmnum, design) pairs, in the order they appear
+        mean = data.groupby(["vmnum", "design"], observed=True, sort=False)[
+            "elapsed"
+        ].mean()
+        agg = mean.groupby(level=0, sort=False).agg(["min", "max"])
         data = data.join(agg, on="vmnum")
         data["ratio"] = data["elapsed"] / data["min"]
         merge.append(data)
@@ -155,7 +163,8 @@ def plot(
 def main(**kwargs):
     data = preprocess(**kwargs)
     chart = plot(data)
-    chart.save("chart.svg")
+    # pin the engine, altair then renders with the vega-lite version of its schema
+    chart.save("chart.svg", engine="vl-convert")
 
 
 if __name__ == "__main__":